@@ -1,5 +1,13 @@
+import os
 import sys
+import ssl
+import socket
 import time
+import queue
+import argparse
+import threading
+import json
+from datetime import datetime, timezone
 
 
 def open_clf():
@@ -23,7 +31,182 @@ def open_clf():
     return None
 
 
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db-host")
+    parser.add_argument("--db-port", type=int)
+    parser.add_argument("--db-name")
+    parser.add_argument("--db-user")
+    parser.add_argument("--db-password")
+    parser.add_argument("--sslmode")
+    parser.add_argument("--schema")
+    parser.add_argument("--table", help="Tabla destino de las lecturas (uid, lector, ndef, fecha); ver DDL junto a insert_scans")
+    parser.add_argument("--lector", help="Identificador del lector guardado con cada lectura")
+    parser.add_argument("--dedup-sec", type=float, default=3.0, help="Ventana en la que se ignora el mismo UID")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--flush-sec", type=float, default=2.0)
+    parser.add_argument("--queue-size", type=int, default=1000)
+    p = parser.parse_args()
+    p.db_host = p.db_host or os.getenv("DB_HOST")
+    p.db_port = p.db_port or int(os.getenv("DB_PORT") or 5432)
+    p.db_name = p.db_name or os.getenv("DB_NAME") or "postgres"
+    p.db_user = p.db_user or os.getenv("DB_USER")
+    p.db_password = p.db_password or os.getenv("DB_PASSWORD")
+    p.sslmode = (p.sslmode or os.getenv("DB_SSLMODE") or "require").lower()
+    p.schema = p.schema or os.getenv("DB_SCHEMA") or "thermo"
+    p.table = p.table or os.getenv("NFC_TABLE") or "nfc_scan"
+    p.lector = p.lector or os.getenv("NFC_LECTOR") or socket.gethostname()
+    p.use_db = all(getattr(p, k) not in (None, "") for k in ["db_host", "db_user", "db_password"])
+    return p
+
+
+def connect_db(p):
+    mode = (p.sslmode or "require").lower()
+    ssl_ctx = None
+    if mode != "disable":
+        ssl_ctx = ssl.create_default_context()
+        if mode in ("require", "prefer", "allow"):
+            ssl_ctx.check_hostname = False
+            ssl_ctx.verify_mode = ssl.CERT_NONE
+        elif mode == "verify-ca":
+            ssl_ctx.check_hostname = False
+            ssl_ctx.verify_mode = ssl.CERT_REQUIRED
+        elif mode == "verify-full":
+            ssl_ctx.check_hostname = True
+            ssl_ctx.verify_mode = ssl.CERT_REQUIRED
+        else:
+            ssl_ctx.check_hostname = False
+            ssl_ctx.verify_mode = ssl.CERT_NONE
+    import pg8000.dbapi as pg
+    conn = pg.connect(user=p.db_user, password=p.db_password, host=p.db_host, port=p.db_port, database=p.db_name, ssl_context=ssl_ctx)
+    try:
+        cur = conn.cursor()
+        try:
+            cur.execute("SET statement_timeout TO 30000")
+        finally:
+            cur.close()
+        conn.commit()
+    except Exception:
+        pass
+    return conn
+
+
+# La tabla destino debe existir; con los valores por defecto:
+#   CREATE TABLE thermo.nfc_scan (
+#       id bigserial PRIMARY KEY,
+#       uid text NOT NULL,
+#       lector text,
+#       ndef text,
+#       fecha timestamptz NOT NULL
+#   );
+#   CREATE INDEX ON thermo.nfc_scan (fecha);
+def insert_scans(conn, schema, table, rows):
+    q = f"""
+    INSERT INTO {schema}.{table} (uid, lector, ndef, fecha)
+    SELECT * FROM unnest(%s::text[], %s::text[], %s::text[], %s::timestamptz[])
+    """
+    cols = [list(c) for c in zip(*rows)]
+    cur = conn.cursor()
+    try:
+        cur.execute(q, cols)
+        conn.commit()
+    finally:
+        cur.close()
+
+
+def decode_ndef(octets):
+    if not octets:
+        return []
+    try:
+        import ndef
+        return [str(r) for r in ndef.message_decoder(octets)]
+    except Exception as e:
+        return ["Error NDEF: " + str(e)]
+
+
+class DedupCache:
+    def __init__(self, window):
+        self.window = window
+        self.seen = {}
+        self.pruned = time.monotonic()
+
+    def check(self, uid, now):
+        last = self.seen.get(uid)
+        self.seen[uid] = now
+        if now - self.pruned > self.window:
+            self.seen = {k: t for k, t in self.seen.items() if now - t < self.window}
+            self.pruned = now
+        return last is None or now - last >= self.window
+
+
+class ScanWriter(threading.Thread):
+    def __init__(self, args, scans):
+        super().__init__(daemon=True)
+        self.args = args
+        self.scans = scans
+        self.conn = None
+        self.batch = []
+        self.backoff = 0
+
+    def flush(self):
+        if not self.batch or not self.args.use_db:
+            self.batch = []
+            return
+        try:
+            if self.conn is None:
+                self.conn = connect_db(self.args)
+            insert_scans(self.conn, self.args.schema, self.args.table, self.batch)
+            print(f"OK {len(self.batch)} lecturas -> {self.args.schema}.{self.args.table}")
+            self.batch = []
+            self.backoff = 0
+        except Exception as e:
+            print("Error DB:", e, file=sys.stderr)
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+            # Conservar las lecturas pendientes para el siguiente intento, con límite
+            self.batch = self.batch[-self.args.queue_size:]
+            self.backoff = min(max(self.backoff * 2, self.args.flush_sec), 60.0)
+
+    def run(self):
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self.scans.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+            if item is None:
+                self.flush()
+                break
+            if item:
+                uid, octets, fecha = item
+                records = decode_ndef(octets)
+                print("UID:", uid)
+                for r in records:
+                    print(r)
+                self.batch.append((uid, self.args.lector, json.dumps(records, ensure_ascii=False) if records else None, fecha))
+                if deadline is None:
+                    deadline = time.monotonic() + self.args.flush_sec
+            # Tras un fallo solo se reintenta al vencer el plazo, con espera exponencial
+            full = not self.backoff and len(self.batch) >= self.args.batch_size
+            if self.batch and (full or time.monotonic() >= deadline):
+                self.flush()
+                if self.batch:
+                    deadline = time.monotonic() + self.backoff
+                else:
+                    deadline = None
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+
+
 def main():
+    args = get_args()
     try:
         import nfc
     except ImportError:
@@ -35,32 +218,48 @@ def main():
         print("No se encontró lector NFC compatible (usb/tty). Conecta un lector por USB/OTG y vuelve a intentar.")
         sys.exit(2)
 
-    print("Lector NFC listo. Acerca una tarjeta...")
-    with clf as c:
-        while True:
+    if not args.use_db:
+        print("Sin parámetros de DB (DB_HOST/DB_USER/DB_PASSWORD): las lecturas solo se muestran.")
+    scans = queue.Queue(maxsize=args.queue_size)
+    writer = ScanWriter(args, scans)
+    writer.start()
+    cache = DedupCache(args.dedup_sec)
+
+    def on_connect(tag):
+        uid = getattr(tag, "identifier", b"")
+        uid_hex = uid.hex().upper() if isinstance(uid, (bytes, bytearray)) else str(uid)
+        if not cache.check(uid_hex, time.monotonic()):
+            return False
+        octets = None
+        ndef_attr = getattr(tag, "ndef", None)
+        if ndef_attr:
             try:
-                def on_connect(tag):
-                    uid = getattr(tag, "identifier", b"")
-                    if isinstance(uid, (bytes, bytearray)):
-                        print("UID:", uid.hex().upper())
-                    ndef_attr = getattr(tag, "ndef", None)
-                    if ndef_attr:
-                        try:
-                            for record in ndef_attr.records:
-                                print(record)
-                        except Exception as e:
-                            print("Error NDEF:", e)
-                    return False
-
-                c.connect(rdwr={"on-connect": on_connect})
-            except KeyboardInterrupt:
-                print("Saliendo...")
-                break
+                octets = bytes(ndef_attr.octets)
             except Exception as e:
-                print("Error:", e)
-                time.sleep(1)
+                print("Error NDEF:", e)
+        try:
+            scans.put_nowait((uid_hex, octets, datetime.now(timezone.utc)))
+        except queue.Full:
+            print("Cola de lecturas llena; lectura descartada:", uid_hex, file=sys.stderr)
+        return False
+
+    rdwr = {"on-connect": on_connect}
+    print("Lector NFC listo. Acerca una tarjeta...")
+    try:
+        with clf as c:
+            while True:
+                try:
+                    c.connect(rdwr=rdwr)
+                except KeyboardInterrupt:
+                    print("Saliendo...")
+                    break
+                except Exception as e:
+                    print("Error:", e)
+                    time.sleep(1)
+    finally:
+        scans.put(None)
+        writer.join(timeout=args.flush_sec + 30)
 
 
 if __name__ == "__main__":
     main()
-
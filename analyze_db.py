@@ -2,8 +2,12 @@ import os
 import sys
 import argparse
 import ssl
+import csv
+import re
+import time
+from itertools import groupby
 import pg8000.dbapi as pg
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 
 
 def get_arg_or_env(parser):
@@ -187,6 +191,8 @@ def list_indexes(conn, schema, table):
         i.relname AS index_name,
         idx.indisunique AS is_unique,
         idx.indisprimary AS is_primary,
+        am.amname AS index_method,
+        pg_get_indexdef(idx.indexrelid) AS index_def,
         array_to_string(ARRAY(
           SELECT pg_get_indexdef(idx.indexrelid, k, TRUE)
           FROM generate_subscripts(idx.indkey::smallint[], 1) AS k
@@ -194,6 +200,7 @@ def list_indexes(conn, schema, table):
         ), ', ') AS index_columns
     FROM pg_index idx
     JOIN pg_class i ON i.oid = idx.indexrelid
+    JOIN pg_am am ON am.oid = i.relam
     JOIN pg_class t ON t.oid = idx.indrelid
     JOIN pg_namespace n ON n.oid = t.relnamespace
     WHERE n.nspname = %s AND t.relname = %s
@@ -314,6 +321,949 @@ def verify_sensor_valor(conn, schema, id_fundo, id_sensorlocalizacion, id_metric
         cur.close()
 
 
+def parse_fecha(s):
+    if s.endswith('Z'):
+        s = s[:-1] + '+00:00'
+    fecha = datetime.fromisoformat(s)
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=timezone.utc)
+    return fecha
+
+
+EXPORT_AGGS = {
+    "avg": "avg(valor)",
+    "min": "min(valor)",
+    "max": "max(valor)",
+    "count": "count(*)",
+    "first": "(array_agg(valor ORDER BY fecha))[1]",
+    "last": "(array_agg(valor ORDER BY fecha DESC))[1]",
+}
+
+
+def export_query(conn, schema, source, desde, hasta, sensores=None, id_fundo=None, id_metrica=None, bucket=None, agg="avg", by_series=False):
+    if source == "sensor_valor":
+        keys = ["id_fundo", "id_sensorlocalizacion", "id_metrica"]
+        sensor_col, metric_col, fundo_col = "id_sensorlocalizacion", "id_metrica", "id_fundo"
+    else:
+        med_cols = {c["column_name"] for c in list_columns(conn, schema, "medicion")}
+        metric_col = "metricaid" if "metricaid" in med_cols else None
+        keys = ["localizacionsensorid"] + ([metric_col] if metric_col else [])
+        sensor_col, fundo_col = "localizacionsensorid", None
+    where = ["fecha >= %s", "fecha < %s"]
+    params = [desde, hasta]
+    if sensores:
+        where.append(f"{sensor_col} = ANY(%s)")
+        params.append(list(sensores))
+    if id_metrica is not None and metric_col:
+        where.append(f"{metric_col} = %s")
+        params.append(id_metrica)
+    if id_fundo is not None and fundo_col:
+        where.append(f"{fundo_col} = %s")
+        params.append(id_fundo)
+    key_s = ", ".join(keys)
+    where_s = " AND ".join(where)
+    if bucket:
+        q = f"""
+        SELECT {key_s}, date_bin(%s::interval, fecha, %s::timestamptz) AS fecha, {EXPORT_AGGS[agg]} AS valor
+        FROM {schema}.{source}
+        WHERE {where_s}
+        GROUP BY {key_s}, {len(keys) + 1}
+        ORDER BY {key_s}, fecha
+        """
+        params = [bucket, desde] + params
+    else:
+        order = f"{key_s}, fecha" if by_series else "fecha"
+        q = f"""
+        SELECT {key_s}, fecha, valor
+        FROM {schema}.{source}
+        WHERE {where_s}
+        ORDER BY {order}
+        """
+    return q, params, keys + ["fecha", "valor"]
+
+
+def stream_query(conn, q, params, chunk_size=10000):
+    cur = conn.cursor()
+    try:
+        cur.execute(f"DECLARE export_cur NO SCROLL CURSOR FOR {q}", params)
+        while True:
+            cur.execute(f"FETCH FORWARD {int(chunk_size)} FROM export_cur")
+            rows = cur.fetchall()
+            if not rows:
+                break
+            yield rows
+        cur.execute("CLOSE export_cur")
+    finally:
+        cur.close()
+
+
+def lttb_pick(a, bucket, nxt):
+    ax, ay = a[0], a[1]
+    cx, cy = nxt
+    best = None
+    best_area = -1.0
+    for p in bucket:
+        area = abs((ax - cx) * (p[1] - ay) - (ax - p[0]) * (cy - ay))
+        if area != area:
+            area = 0.0
+        if area > best_area:
+            best, best_area = p, area
+    return best
+
+
+def bucket_avg(bucket):
+    n = len(bucket)
+    return sum(p[0] for p in bucket) / n, sum(p[1] for p in bucket) / n
+
+
+def lttb_series(points, t0, width):
+    # LTTB por ventanas de tiempo fijas: solo se retienen el bucket a decidir y el siguiente
+    it = iter(points)
+    a = next(it, None)
+    if a is None:
+        return
+    yield a[2]
+    cur = []
+    nxt = []
+    nxt_b = None
+    for p in it:
+        b = int((p[0] - t0) // width)
+        if nxt and b != nxt_b:
+            if cur:
+                a = lttb_pick(a, cur, bucket_avg(nxt))
+                yield a[2]
+            cur = nxt
+            nxt = []
+        nxt.append(p)
+        nxt_b = b
+    if not nxt:
+        return
+    last = nxt.pop()
+    if cur:
+        a = lttb_pick(a, cur, bucket_avg(nxt) if nxt else last[:2])
+        yield a[2]
+    if nxt:
+        yield lttb_pick(a, nxt, last[:2])[2]
+    yield last[2]
+
+
+def lttb_rows(chunks, key_len, desde, hasta, n_out):
+    width = max((hasta - desde).total_seconds() / max(n_out - 2, 1), 1e-6)
+    t0 = desde.timestamp()
+
+    def flat():
+        for rows in chunks:
+            for r in rows:
+                yield r
+
+    def points(group):
+        for r in group:
+            y = float(r[key_len + 1]) if r[key_len + 1] is not None else float("nan")
+            yield (r[key_len].timestamp(), y, r)
+
+    batch = []
+    for _, group in groupby(flat(), key=lambda r: tuple(r[:key_len])):
+        for r in lttb_series(points(group), t0, width):
+            batch.append(r)
+            if len(batch) >= 10000:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def parquet_type(pa, column):
+    if column in ("fecha", "hora"):
+        return pa.timestamp("us", tz="UTC")
+    if column == "valor":
+        return pa.float64()
+    return pa.int64()
+
+
+def export_rows(chunks, columns, output=None):
+    n = 0
+    if output and output.lower().endswith(".parquet"):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Falta dependencia: pyarrow. Instala con: pip install pyarrow")
+        schema = pa.schema([(c, parquet_type(pa, c)) for c in columns])
+        writer = pq.ParquetWriter(output, schema)
+        try:
+            for rows in chunks:
+                if not rows:
+                    continue
+                cols = list(zip(*rows))
+                arrays = []
+                for i, field in enumerate(schema):
+                    vals = list(cols[i])
+                    if pa.types.is_floating(field.type):
+                        vals = [None if x is None else float(x) for x in vals]
+                    arrays.append(pa.array(vals, type=field.type))
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                n += len(rows)
+        finally:
+            writer.close()
+        return n
+    f = open(output, "w", newline="", encoding="utf-8") if output else sys.stdout
+    try:
+        w = csv.writer(f)
+        w.writerow(columns)
+        for rows in chunks:
+            if not rows:
+                continue
+            for r in rows:
+                w.writerow([x.isoformat() if isinstance(x, datetime) else x for x in r])
+            n += len(rows)
+    finally:
+        if output:
+            f.close()
+    return n
+
+
+def in_range(fecha, desde=None, hasta=None):
+    return (desde is None or fecha >= desde) and (hasta is None or fecha <= hasta)
+
+
+def load_expected_csv(path, desde=None, hasta=None):
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            fecha = parse_fecha(row["fecha"])
+            if not in_range(fecha, desde, hasta):
+                continue
+            yield (
+                int(row["id_fundo"]),
+                int(row["id_sensorlocalizacion"]),
+                int(row["id_metrica"]),
+                float(row["valor"]) if row.get("valor") not in (None, "") else None,
+                fecha,
+            )
+
+
+def load_expected_capture(path, config, desde=None, hasta=None):
+    from s7data import load_config, read_capture, decode_blocks, row_ids
+    variables = load_config(config)
+    for now, blocks in read_capture(path):
+        if not in_range(now, desde, hasta):
+            continue
+        for v, val in decode_blocks(variables, blocks):
+            yield row_ids(v) + (val, now)
+
+
+def load_expected_store(path, config, desde=None, hasta=None):
+    from s7data import load_config, row_ids, store_name
+    from tsstore import LocalStore, from_ms
+    store = LocalStore(path, retention_hours=0)
+    for v in load_config(config):
+        ids = row_ids(v)
+        for ts, val in store.query(store_name(v), desde, hasta):
+            yield ids + (val, from_ms(ts))
+
+
+def load_expected(path, config="plc_config.json", desde=None, hasta=None):
+    if os.path.isdir(path):
+        return load_expected_store(path, config, desde, hasta)
+    if path.lower().endswith(".csv"):
+        return load_expected_csv(path, desde, hasta)
+    return load_expected_capture(path, config, desde, hasta)
+
+
+def reconcile(conn, schema, expected, tolerance):
+    state = {"n": 0, "lo": None, "hi": None}
+
+    def copy_lines():
+        buf = []
+        for id_fundo, id_sl, id_met, valor, fecha in expected:
+            state["n"] += 1
+            if state["lo"] is None or fecha < state["lo"]:
+                state["lo"] = fecha
+            if state["hi"] is None or fecha > state["hi"]:
+                state["hi"] = fecha
+            buf.append(f"{id_fundo},{id_sl},{id_met},{'' if valor is None else repr(float(valor))},{fecha.isoformat()}\n")
+            if len(buf) >= 5000:
+                yield "".join(buf)
+                buf = []
+        if buf:
+            yield "".join(buf)
+
+    med_cols = {c["column_name"] for c in list_columns(conn, schema, "medicion")}
+    conn.commit()
+    cur = conn.cursor()
+    try:
+        # Transacción de escritura solo para las tablas temporales; se descarta con rollback
+        cur.execute("SET TRANSACTION READ WRITE")
+        cur.execute("SET LOCAL statement_timeout TO 300000")
+        cur.execute("""
+        CREATE TEMP TABLE reconcile_expected (
+            rid bigserial,
+            id_fundo bigint,
+            id_sensorlocalizacion bigint,
+            id_metrica bigint,
+            valor float8,
+            fecha timestamptz
+        ) ON COMMIT DROP
+        """)
+        cur.execute(
+            "COPY reconcile_expected (id_fundo, id_sensorlocalizacion, id_metrica, valor, fecha) FROM STDIN WITH (FORMAT csv)",
+            stream=copy_lines(),
+        )
+        if not state["n"]:
+            return [], 0
+        cur.execute("ANALYZE reconcile_expected")
+        lo = state["lo"] - tolerance
+        hi = state["hi"] + tolerance
+        match = """
+            ON s.id_fundo = e.id_fundo AND s.id_sensorlocalizacion = e.id_sensorlocalizacion AND s.id_metrica = e.id_metrica
+           AND s.fecha BETWEEN e.fecha - %s::interval AND e.fecha + %s::interval
+           AND s.fecha BETWEEN %s::timestamptz AND %s::timestamptz
+        """
+        params = [tolerance, tolerance, lo, hi, tolerance, tolerance, lo, hi]
+        if "localizacionsensorid" in med_cols:
+            med_match = "ON m.localizacionsensorid = e.id_sensorlocalizacion"
+            if "metricaid" in med_cols:
+                med_match += " AND m.metricaid = e.id_metrica"
+            md = f"""
+            SELECT e.rid, count(*) AS n FROM reconcile_expected e JOIN {schema}.medicion m
+            {med_match}
+           AND m.fecha BETWEEN e.fecha - %s::interval AND e.fecha + %s::interval
+           AND m.fecha BETWEEN %s::timestamptz AND %s::timestamptz
+            GROUP BY e.rid
+            """
+            params += [tolerance, tolerance, lo, hi]
+        else:
+            md = "SELECT NULL::bigint AS rid, NULL::bigint AS n WHERE false"
+        cur.execute(f"""
+        CREATE TEMP TABLE reconcile_result ON COMMIT DROP AS
+        WITH sv AS (
+            SELECT e.rid, count(*) AS n FROM reconcile_expected e JOIN {schema}.sensor_valor s
+            {match}
+            GROUP BY e.rid
+        ), er AS (
+            SELECT e.rid, count(*) AS n FROM reconcile_expected e JOIN {schema}.sensor_valor_error s
+            {match}
+            GROUP BY e.rid
+        ), md AS ({md})
+        SELECT e.id_sensorlocalizacion, e.id_metrica, date_trunc('hour', e.fecha) AS hora,
+               coalesce(sv.n, 0) AS n_sv, coalesce(er.n, 0) AS n_err, coalesce(md.n, 0) AS n_med
+        FROM reconcile_expected e
+        LEFT JOIN sv ON sv.rid = e.rid
+        LEFT JOIN er ON er.rid = e.rid
+        LEFT JOIN md ON md.rid = e.rid
+        """, params)
+        has_med = "localizacionsensorid" in med_cols
+        cur.execute(f"""
+        SELECT id_sensorlocalizacion, id_metrica, hora,
+               count(*) AS esperadas,
+               count(*) FILTER (WHERE n_sv = 0 AND n_err = 0) AS faltantes,
+               count(*) FILTER (WHERE n_sv > 1) AS duplicadas,
+               count(*) FILTER (WHERE n_err > 0) AS con_error,
+               count(*) FILTER (WHERE {'n_sv > 0 AND n_med = 0' if has_med else 'false'}) AS sin_propagar
+        FROM reconcile_result
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2, 3
+        """)
+        return fetch_dicts(cur), state["n"]
+    finally:
+        cur.close()
+        conn.rollback()
+
+
+def column_stats(conn, schema, table, column):
+    q = """
+    SELECT correlation, n_distinct, null_frac
+    FROM pg_stats
+    WHERE schemaname = %s AND tablename = %s AND attname = %s
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(q, (schema, table, column))
+        rows = fetch_dicts(cur)
+        return rows[0] if rows else None
+    finally:
+        cur.close()
+
+
+def table_info(conn, schema, table):
+    q = """
+    SELECT c.relkind, c.relrowsecurity AS row_security,
+           pg_total_relation_size(c.oid) AS total_bytes,
+           (SELECT count(*) FROM pg_policy pol WHERE pol.polrelid = c.oid) AS policies,
+           (SELECT count(*) FROM pg_attribute a WHERE a.attrelid = c.oid AND a.attidentity <> '' AND NOT a.attisdropped) AS identity_cols,
+           (SELECT string_agg(pub.pubname, ', ') FROM pg_publication_rel pr JOIN pg_publication pub ON pub.oid = pr.prpubid WHERE pr.prrelid = c.oid) AS publications
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = %s AND c.relname = %s
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(q, (schema, table))
+        rows = fetch_dicts(cur)
+        return rows[0] if rows else None
+    finally:
+        cur.close()
+
+
+def list_partitions(conn, schema, table):
+    q = """
+    SELECT ch.relname AS partition_name, pg_get_expr(ch.relpartbound, ch.oid) AS partition_bound
+    FROM pg_inherits i
+    JOIN pg_class ch ON ch.oid = i.inhrelid
+    JOIN pg_class p ON p.oid = i.inhparent
+    JOIN pg_namespace n ON n.oid = p.relnamespace
+    WHERE n.nspname = %s AND p.relname = %s
+    ORDER BY ch.relname
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(q, (schema, table))
+        return fetch_dicts(cur)
+    finally:
+        cur.close()
+
+
+def list_dependents(conn, schema, table):
+    q = """
+    SELECT DISTINCT 'view' AS kind, vn.nspname || '.' || v.relname AS name
+    FROM pg_depend d
+    JOIN pg_rewrite r ON r.oid = d.objid
+    JOIN pg_class v ON v.oid = r.ev_class
+    JOIN pg_namespace vn ON vn.oid = v.relnamespace
+    WHERE d.refobjid = (quote_ident(%s) || '.' || quote_ident(%s))::regclass AND v.oid <> d.refobjid
+    UNION ALL
+    SELECT 'foreign key' AS kind, con.conname || ' on ' || con.conrelid::regclass::text AS name
+    FROM pg_constraint con
+    WHERE con.contype = 'f' AND con.confrelid = (quote_ident(%s) || '.' || quote_ident(%s))::regclass
+    ORDER BY 1, 2
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(q, (schema, table, schema, table))
+        return fetch_dicts(cur)
+    finally:
+        cur.close()
+
+
+def list_table_grants(conn, schema, table):
+    q = """
+    SELECT grantee, privilege_type
+    FROM information_schema.role_table_grants
+    WHERE table_schema = %s AND table_name = %s
+    ORDER BY grantee, privilege_type
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(q, (schema, table))
+        return fetch_dicts(cur)
+    finally:
+        cur.close()
+
+
+def column_range(conn, schema, table, column):
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT min({column}), max({column}) FROM {schema}.{table}")
+        return cur.fetchone()
+    finally:
+        cur.close()
+
+
+def period_start(d, interval):
+    if d.tzinfo is None:
+        d = d.replace(tzinfo=timezone.utc)
+    d = d.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "month":
+        return d.replace(day=1)
+    if interval == "week":
+        return d - timedelta(days=d.weekday())
+    return d
+
+
+def period_next(d, interval):
+    if interval == "month":
+        return d.replace(year=d.year + 1, month=1) if d.month == 12 else d.replace(month=d.month + 1)
+    if interval == "week":
+        return d + timedelta(days=7)
+    return d + timedelta(days=1)
+
+
+def partition_name(table, start, interval):
+    return f"{table}_p{start:%Y%m}" if interval == "month" else f"{table}_p{start:%Y%m%d}"
+
+
+def parse_partition_bound(bound):
+    m = re.search(r"FROM \('([^']+)'\) TO \('([^']+)'\)", bound or "")
+    if not m:
+        return None
+    try:
+        return parse_fecha(m.group(1)), parse_fecha(m.group(2))
+    except Exception:
+        return None
+
+
+def partition_ddl(schema, parent, name, start, end):
+    return f"CREATE TABLE IF NOT EXISTS {schema}.{name} PARTITION OF {schema}.{parent} FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+
+
+def brin_steps(schema, table, column, partitions):
+    idx = f"{table}_{column}_brin"
+    if partitions is None:
+        return [{
+            "desc": f"Índice BRIN sobre {column}",
+            "sql": [f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {idx} ON {schema}.{table} USING brin ({column}) WITH (pages_per_range = 32)"],
+            "concurrent": True,
+        }]
+    sql = [f"CREATE INDEX IF NOT EXISTS {idx} ON ONLY {schema}.{table} USING brin ({column}) WITH (pages_per_range = 32)"]
+    steps = [{"desc": f"Índice BRIN sobre {column} en la tabla padre", "sql": sql, "concurrent": False}]
+    for p in partitions:
+        pidx = f"{p}_{column}_brin"
+        steps.append({
+            "desc": f"Índice BRIN en la partición {p}",
+            "sql": [f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {pidx} ON {schema}.{p} USING brin ({column}) WITH (pages_per_range = 32)"],
+            "concurrent": True,
+        })
+        steps.append({
+            "desc": f"Adjuntar {pidx} a {idx}",
+            "sql": [f"ALTER INDEX {schema}.{idx} ATTACH PARTITION {schema}.{pidx}"],
+            "concurrent": False,
+        })
+    return steps
+
+
+def copy_in_batches(conn, schema, src, dst, column, start, end, batch):
+    cur = conn.cursor()
+    total = 0
+    try:
+        a = start
+        while a < end:
+            b = min(a + batch, end)
+            cur.execute(f"INSERT INTO {schema}.{dst} SELECT * FROM {schema}.{src} WHERE {column} >= %s AND {column} < %s", (a, b))
+            n = cur.rowcount if cur.rowcount and cur.rowcount > 0 else 0
+            conn.commit()
+            total += n
+            print(f"      [{a.isoformat()}, {b.isoformat()}) {n} filas")
+            a = b
+    finally:
+        cur.close()
+    return f"{total} filas copiadas"
+
+
+def list_fk_defs(conn, schema, table):
+    q = """
+    SELECT con.conname AS constraint_name, pg_get_constraintdef(con.oid) AS constraint_def
+    FROM pg_constraint con
+    WHERE con.contype = 'f' AND con.conrelid = (quote_ident(%s) || '.' || quote_ident(%s))::regclass
+    ORDER BY con.conname
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(q, (schema, table))
+        return fetch_dicts(cur)
+    finally:
+        cur.close()
+
+
+def list_owned_sequences(conn, schema, table):
+    q = """
+    SELECT s.oid::regclass::text AS sequence_name, a.attname AS column_name
+    FROM pg_depend d
+    JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S'
+    JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+    WHERE d.classid = 'pg_class'::regclass
+      AND d.refobjid = (quote_ident(%s) || '.' || quote_ident(%s))::regclass
+      AND d.deptype = 'a'
+    ORDER BY 1
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(q, (schema, table))
+        return fetch_dicts(cur)
+    finally:
+        cur.close()
+
+
+def tracking_ddl(schema, table, new, column):
+    return [
+        f"CREATE TABLE {schema}.{new}_changes (id bigserial PRIMARY KEY, {column} timestamptz)",
+        f"""CREATE FUNCTION {schema}.{new}_track() RETURNS trigger LANGUAGE plpgsql AS $fn$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO {schema}.{new}_changes ({column}) VALUES (OLD.{column});
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO {schema}.{new}_changes ({column}) VALUES (NEW.{column});
+    END IF;
+    RETURN NULL;
+END
+$fn$""",
+        f"CREATE TRIGGER {new}_track AFTER INSERT OR UPDATE OR DELETE ON {schema}.{table} FOR EACH ROW EXECUTE FUNCTION {schema}.{new}_track()",
+    ]
+
+
+def resync_range(cur, schema, src, dst, cond, params):
+    cur.execute(f"DELETE FROM {schema}.{dst} WHERE {cond}", params)
+    cur.execute(f"INSERT INTO {schema}.{dst} SELECT * FROM {schema}.{src} WHERE {cond}", params)
+    return cur.rowcount if cur.rowcount and cur.rowcount > 0 else 0
+
+
+def ranges_differ(cur, schema, src, dst, cond, params):
+    cur.execute(
+        f"""SELECT EXISTS (SELECT * FROM {schema}.{src} WHERE {cond} EXCEPT ALL SELECT * FROM {schema}.{dst} WHERE {cond})
+            OR EXISTS (SELECT * FROM {schema}.{dst} WHERE {cond} EXCEPT ALL SELECT * FROM {schema}.{src} WHERE {cond})""",
+        list(params) * 4,
+    )
+    return bool(cur.fetchone()[0])
+
+
+def changed_windows(cur, schema, new, column, first, batch, upto):
+    secs = batch.total_seconds()
+    cur.execute(
+        f"SELECT DISTINCT floor(extract(epoch FROM {column} - %s::timestamptz) / %s)::bigint FROM {schema}.{new}_changes WHERE id <= %s AND {column} IS NOT NULL ORDER BY 1",
+        (first, secs, upto),
+    )
+    ks = [r[0] for r in cur.fetchall()]
+    cur.execute(f"SELECT EXISTS (SELECT 1 FROM {schema}.{new}_changes WHERE id <= %s AND {column} IS NULL)", (upto,))
+    has_null = bool(cur.fetchone()[0])
+    return [(first + k * batch, first + (k + 1) * batch) for k in ks], has_null
+
+
+def sync_changes(conn, schema, src, dst, column, first, batch, locked=False):
+    # Reaplica desde la tabla original cada lote cuyo rango de fecha registró
+    # INSERT/UPDATE/DELETE durante la copia; bajo bloqueo además verifica cada lote
+    cur = conn.cursor()
+    total = 0
+    try:
+        cur.execute(f"SELECT max(id) FROM {schema}.{dst}_changes")
+        upto = cur.fetchone()[0]
+        if upto is None:
+            return 0
+        windows, has_null = changed_windows(cur, schema, dst, column, first, batch, upto)
+        ranges = [(f"{column} >= %s AND {column} < %s", (a, b)) for a, b in windows]
+        if has_null:
+            ranges.append((f"{column} IS NULL", ()))
+        for cond, params in ranges:
+            n = resync_range(cur, schema, src, dst, cond, params)
+            if locked and ranges_differ(cur, schema, src, dst, cond, params):
+                raise RuntimeError(f"diferencias tras resincronizar {cond} {params}; intercambio cancelado")
+            if not locked:
+                conn.commit()
+            total += n
+            print(f"      {cond} {tuple(p.isoformat() for p in params)}: {n} filas")
+        cur.execute(f"DELETE FROM {schema}.{dst}_changes WHERE id <= %s", (upto,))
+        if not locked:
+            conn.commit()
+    finally:
+        cur.close()
+    return total
+
+
+def swap_tables(conn, schema, table, new, old, column, first, batch, cutoff, triggers, grants, sequences):
+    cur = conn.cursor()
+    try:
+        cur.execute("SET LOCAL lock_timeout TO 10000")
+        cur.execute(f"LOCK TABLE {schema}.{table} IN SHARE ROW EXCLUSIVE MODE")
+        n = sync_changes(conn, schema, table, new, column, first, batch, locked=True)
+        # Filas posteriores al corte de la copia o sin fecha que existían antes del registro de cambios
+        for cond, params in ((f"{column} >= %s", (cutoff,)), (f"{column} IS NULL", ())):
+            n += resync_range(cur, schema, table, new, cond, params)
+            if ranges_differ(cur, schema, table, new, cond, params):
+                raise RuntimeError(f"diferencias en {cond}; intercambio cancelado")
+        cur.execute(f"DROP TRIGGER {new}_track ON {schema}.{table}")
+        cur.execute(f"ALTER TABLE {schema}.{table} RENAME TO {old}")
+        cur.execute(f"ALTER TABLE {schema}.{new} RENAME TO {table}")
+        for tg in triggers:
+            cur.execute(tg["trigger_def"])
+        for g in grants:
+            grantee = "PUBLIC" if g["grantee"] == "PUBLIC" else '"' + g["grantee"].replace('"', '""') + '"'
+            cur.execute(f'GRANT {g["privilege_type"]} ON {schema}.{table} TO {grantee}')
+        for sq in sequences:
+            cur.execute(f"ALTER SEQUENCE {sq['sequence_name']} OWNED BY {schema}.{table}.{sq['column_name']}")
+        cur.execute(f"DROP TABLE {schema}.{new}_changes")
+        cur.execute(f"DROP FUNCTION {schema}.{new}_track()")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return f"{n} filas resincronizadas bajo bloqueo; tabla anterior conservada como {schema}.{old}"
+
+
+def plan_partitioning(conn, schema, table, column="fecha", interval="month", premake=3, min_rows=5000000, batch_days=1):
+    notes = []
+    steps = []
+    info = table_info(conn, schema, table)
+    if info is None:
+        raise RuntimeError(f"No existe {schema}.{table}")
+    cols = {c["column_name"]: c for c in list_columns(conn, schema, table)}
+    if column not in cols:
+        raise RuntimeError(f"{schema}.{table} no tiene la columna {column}")
+    idx = list_indexes(conn, schema, table)
+    est = estimate_rows(conn, schema, table)
+    stats = column_stats(conn, schema, table, column)
+    corr = stats["correlation"] if stats and stats["correlation"] is not None else None
+    has_brin = any(ix["index_method"] == "brin" and ix["index_columns"] == column for ix in idx)
+    btree_on_col = [ix["index_name"] for ix in idx if ix["index_method"] == "btree" and ix["index_columns"].split(", ")[0] == column]
+    notes.append(f"filas estimadas={est if est is not None else 'N/A'}, tamaño={info['total_bytes'] or 0} bytes, correlación({column})={'N/A' if corr is None else f'{corr:.3f}'}")
+    now = datetime.now(timezone.utc)
+    horizon = period_start(now, interval)
+    for _ in range(premake + 1):
+        horizon = period_next(horizon, interval)
+
+    if info["relkind"] == "p":
+        parts = list_partitions(conn, schema, table)
+        notes.append(f"tabla particionada con {len(parts)} particiones")
+        if not has_brin:
+            steps.extend(brin_steps(schema, table, column, [p["partition_name"] for p in parts]))
+        covered = [b for b in (parse_partition_bound(p["partition_bound"]) for p in parts) if b]
+        names = {p["partition_name"] for p in parts}
+        a = period_start(now, interval)
+        while a < horizon:
+            b = period_next(a, interval)
+            name = partition_name(table, a, interval)
+            if name not in names and not any(lo <= a and b <= hi for lo, hi in covered):
+                steps.append({"desc": f"Crear partición {name} [{a.date()}, {b.date()})", "sql": [partition_ddl(schema, table, name, a, b)], "concurrent": False})
+            a = b
+        return notes, steps
+
+    brin = []
+    if not has_brin and (corr is None or abs(corr) >= 0.9):
+        brin = brin_steps(schema, table, column, None)
+    elif not has_brin:
+        notes.append(f"correlación baja en {column}; un índice BRIN sería poco selectivo")
+    if btree_on_col and (has_brin or brin):
+        notes.append(f"con BRIN, el índice btree {', '.join(btree_on_col)} podría eliminarse tras verificar los planes de consulta")
+    if est is None or est < min_rows:
+        notes.append(f"menos de {min_rows} filas estimadas; no se recomienda particionar todavía")
+        return notes, brin
+
+    blockers = [f"{d['kind']} {d['name']}" for d in list_dependents(conn, schema, table)]
+    if info["row_security"] or info["policies"]:
+        blockers.append("RLS/policies activas")
+    if info["identity_cols"]:
+        blockers.append("columnas identity")
+    if info["publications"]:
+        blockers.append(f"publicaciones {info['publications']}")
+    new = f"{table}_part"
+    old = f"{table}_old"
+    ddl = [f"CREATE TABLE {schema}.{new} (LIKE {schema}.{table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE INCLUDING COMMENTS) PARTITION BY RANGE ({column})"]
+    for ix in idx:
+        if ix["is_primary"]:
+            pk = [c.strip() for c in ix["index_columns"].split(",")]
+            if column not in pk:
+                notes.append(f"la clave primaria ({', '.join(pk)}) se amplía con {column} en la tabla particionada")
+                pk.append(column)
+            ddl.append(f"ALTER TABLE {schema}.{new} ADD PRIMARY KEY ({', '.join(pk)})")
+        elif ix["is_unique"] and column not in [c.strip() for c in ix["index_columns"].split(",")]:
+            blockers.append(f"índice único {ix['index_name']} sin {column}")
+        else:
+            m = re.match(r"CREATE (UNIQUE )?INDEX \S+ ON (?:ONLY )?\S+ (.*)$", ix["index_def"] or "")
+            if m:
+                ddl.append(f"CREATE {m.group(1) or ''}INDEX ON {schema}.{new} {m.group(2)}")
+    if not has_brin:
+        ddl.append(f"CREATE INDEX ON {schema}.{new} USING brin ({column}) WITH (pages_per_range = 32)")
+    # LIKE no copia las claves foráneas salientes
+    for fk in list_fk_defs(conn, schema, table):
+        ddl.append(f"ALTER TABLE {schema}.{new} ADD CONSTRAINT {fk['constraint_name']} {fk['constraint_def']}")
+    lo, hi = column_range(conn, schema, table, column)
+    first = period_start(lo or now, interval)
+    a = first
+    while a < horizon:
+        b = period_next(a, interval)
+        ddl.append(partition_ddl(schema, new, partition_name(table, a, interval), a, b))
+        a = b
+    ddl.append(f"CREATE TABLE IF NOT EXISTS {schema}.{table}_pdefault PARTITION OF {schema}.{new} DEFAULT")
+    notes.append(f"rango de {column}: {lo} .. {hi}")
+    if blockers:
+        notes.append("conversión a tabla particionada bloqueada: " + "; ".join(blockers))
+        return notes, brin
+    batch = timedelta(days=batch_days)
+    cutoff = period_start(now, "day") + timedelta(days=1)
+    triggers = list_triggers(conn, schema, table)
+    grants = list_table_grants(conn, schema, table)
+    sequences = list_owned_sequences(conn, schema, table)
+    cleanup = f"para deshacer: DROP TRIGGER IF EXISTS {new}_track ON {schema}.{table}; DROP TABLE IF EXISTS {schema}.{new}, {schema}.{new}_changes; DROP FUNCTION IF EXISTS {schema}.{new}_track()"
+    steps.append({"desc": f"Crear {schema}.{new} particionada por {interval} con índices, claves foráneas y particiones", "sql": ddl, "concurrent": False, "cleanup": cleanup})
+    steps.append({"desc": f"Registrar cambios en {table} durante la conversión ({new}_changes)", "sql": tracking_ddl(schema, table, new, column), "concurrent": False, "cleanup": cleanup})
+    steps.append({
+        "desc": f"Copiar datos a {new} en lotes de {batch_days} día(s) hasta {cutoff.date()}",
+        "sql": [f"INSERT INTO {schema}.{new} SELECT * FROM {schema}.{table} WHERE {column} >= <desde> AND {column} < <hasta>"],
+        "fn": lambda c: copy_in_batches(c, schema, table, new, column, first, cutoff, batch),
+        "cleanup": cleanup,
+    })
+    steps.append({
+        "desc": "Resincronizar los lotes con cambios registrados durante la copia",
+        "sql": [f"DELETE FROM {schema}.{new} WHERE <lote>", f"INSERT INTO {schema}.{new} SELECT * FROM {schema}.{table} WHERE <lote>"],
+        "fn": lambda c: f"{sync_changes(c, schema, table, new, column, first, batch)} filas resincronizadas",
+        "cleanup": cleanup,
+    })
+    steps.append({
+        "desc": f"Intercambiar {table} y {new} bajo bloqueo tras resincronizar y verificar los últimos cambios; recrear {len(triggers)} trigger(s), {len(grants)} permiso(s) y {len(sequences)} secuencia(s)",
+        "sql": [
+            f"LOCK TABLE {schema}.{table} IN SHARE ROW EXCLUSIVE MODE",
+            f"<resincronizar y verificar lotes de {new}_changes, {column} >= {cutoff.isoformat()} y {column} IS NULL>",
+            f"DROP TRIGGER {new}_track ON {schema}.{table}",
+            f"ALTER TABLE {schema}.{table} RENAME TO {old}",
+            f"ALTER TABLE {schema}.{new} RENAME TO {table}",
+        ] + [tg["trigger_def"] for tg in triggers]
+          + [f"ALTER SEQUENCE {sq['sequence_name']} OWNED BY {schema}.{table}.{sq['column_name']}" for sq in sequences],
+        "fn": lambda c: swap_tables(c, schema, table, new, old, column, first, batch, cutoff, triggers, grants, sequences),
+        "cleanup": cleanup,
+    })
+    return notes, steps
+
+
+def apply_steps(conn, steps):
+    conn.commit()
+    cur = conn.cursor()
+    try:
+        cur.execute("SET statement_timeout TO 0")
+        conn.commit()
+    finally:
+        cur.close()
+    for i, st in enumerate(steps, 1):
+        print(f"  [{i}/{len(steps)}] {st['desc']}")
+        t0 = time.monotonic()
+        try:
+            if st.get("fn"):
+                msg = st["fn"](conn)
+            else:
+                conn.autocommit = bool(st.get("concurrent"))
+                cur = conn.cursor()
+                try:
+                    for q in st["sql"]:
+                        cur.execute(q)
+                finally:
+                    cur.close()
+                if not conn.autocommit:
+                    conn.commit()
+                msg = "OK"
+        except Exception as e:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            print(f"      ERROR: {e}", file=sys.stderr)
+            print(f"  Aplicación detenida en el paso {i}; los pasos anteriores quedaron aplicados.", file=sys.stderr)
+            if st.get("cleanup"):
+                print(f"  {st['cleanup'][0].upper()}{st['cleanup'][1:]}", file=sys.stderr)
+            return False
+        finally:
+            conn.autocommit = False
+        print(f"      {msg} ({time.monotonic() - t0:.1f}s)")
+    return True
+
+
+def pg_stat_statements_schema(conn):
+    q = """
+    SELECT n.nspname
+    FROM pg_extension e
+    JOIN pg_namespace n ON n.oid = e.extnamespace
+    WHERE e.extname = 'pg_stat_statements'
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(q)
+        r = cur.fetchone()
+        return r[0] if r else None
+    finally:
+        cur.close()
+
+
+def snapshot_statements(conn, ext_schema, schema):
+    cols = {c["column_name"] for c in list_columns(conn, ext_schema, "pg_stat_statements")}
+    total = "total_exec_time" if "total_exec_time" in cols else "total_time"
+    toplevel = "s.toplevel" if "toplevel" in cols else "true"
+    # Referencias calificadas al esquema, con o sin comillas ("thermo"."sensor_valor")
+    params = ['(^|[^[:alnum:]_$])"?' + re.escape(schema) + '"?\\.']
+    nested = ""
+    tables = list_tables(conn, schema)
+    if "toplevel" in cols and tables:
+        # Sentencias anidadas (funciones de trigger) que usan search_path sin calificar
+        nested = "OR (NOT s.toplevel AND s.query ~* %s)"
+        names = "|".join(re.escape(t) for t in tables)
+        params.append('(^|[^[:alnum:]_$."])"?(' + names + ')"?($|[^[:alnum:]_$])')
+    q = f"""
+    SELECT s.userid, s.dbid, s.queryid, {toplevel} AS toplevel, s.query,
+           s.calls, s.{total} AS total_ms, s.rows, s.shared_blks_hit, s.shared_blks_read
+    FROM {ext_schema}.pg_stat_statements s
+    WHERE s.dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+      AND (s.query ~* %s {nested})
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(q, tuple(params))
+        return {(r["userid"], r["dbid"], r["queryid"], r["toplevel"]): r for r in fetch_dicts(cur)}
+    finally:
+        cur.close()
+
+
+STATEMENT_COUNTERS = ["calls", "total_ms", "rows", "shared_blks_hit", "shared_blks_read"]
+
+
+def diff_statements(before, after):
+    out = {}
+    for key, r in after.items():
+        b = before.get(key)
+        d = dict(r)
+        for k in STATEMENT_COUNTERS:
+            d[k] = (r[k] or 0) - ((b[k] or 0) if b else 0)
+        if d["calls"] > 0:
+            out[key] = d
+    return out
+
+
+def statement_hints(r):
+    hints = []
+    calls = r["calls"] or 0
+    rows = r["rows"] or 0
+    hit = r["shared_blks_hit"] or 0
+    read = r["shared_blks_read"] or 0
+    q = (r["query"] or "").lstrip().upper()
+    if not r["toplevel"]:
+        hints.append("ejecutada desde trigger/función: revisar el cuerpo de la función")
+    if q.startswith("INSERT") and calls >= 1000 and rows <= calls:
+        hints.append("insert fila a fila: agrupar en lotes (unnest/COPY)")
+    if read and hit / (hit + read) < 0.95:
+        hints.append("muchas lecturas de disco: revisar índices o BRIN sobre fecha")
+    if calls and r["total_ms"] / calls > 100:
+        hints.append("latencia media alta: revisar EXPLAIN (ANALYZE, BUFFERS)")
+    if calls and rows / calls > 10000:
+        hints.append("devuelve muchas filas por llamada: agregar en la base (date_bin) o paginar")
+    return hints
+
+
+def rank_statements(stats, order="total", limit=20):
+    keys = {
+        "total": lambda r: r["total_ms"],
+        "mean": lambda r: r["total_ms"] / r["calls"] if r["calls"] else 0,
+        "calls": lambda r: r["calls"],
+        "rows": lambda r: r["rows"],
+        "reads": lambda r: r["shared_blks_read"],
+    }
+    return sorted(stats.values(), key=keys[order], reverse=True)[:limit]
+
+
+def print_statements(rows, seconds=None, detail=False):
+    grand = sum(r["total_ms"] for r in rows) or 1.0
+    for i, r in enumerate(rows, 1):
+        calls = r["calls"] or 0
+        hit = r["shared_blks_hit"] or 0
+        read = r["shared_blks_read"] or 0
+        hit_s = f"{100.0 * hit / (hit + read):.1f}%" if hit + read else "N/A"
+        mean = r["total_ms"] / calls if calls else 0.0
+        origin = "top" if r["toplevel"] else "anidada"
+        if seconds:
+            head = f"calls/s={calls / seconds:.2f} ms/s={r['total_ms'] / seconds:.1f} rows/s={(r['rows'] or 0) / seconds:.1f}"
+        else:
+            head = f"calls={calls} total_ms={r['total_ms']:.1f} rows={r['rows'] or 0}"
+        print(f"{i:>3}. {head} mean_ms={mean:.2f} hit={hit_s} read_blks={read} share={100.0 * r['total_ms'] / grand:.1f}% [{origin}]")
+        q = " ".join((r["query"] or "").split())
+        print(f"     {q if detail else q[:160]}")
+        for h in statement_hints(r):
+            print(f"     -> {h}")
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--db-host")
@@ -335,6 +1285,30 @@ def main():
     parser.add_argument("--valor", type=float)
     parser.add_argument("--fecha")
     parser.add_argument("--verify-sensor-valor", action="store_true")
+    parser.add_argument("--export", choices=["sensor_valor", "medicion"], help="Stream history of a table for a time range")
+    parser.add_argument("--desde", help="Range start (ISO 8601)")
+    parser.add_argument("--hasta", help="Range end (ISO 8601), defaults to now")
+    parser.add_argument("--sensores", help="Comma-separated sensor location ids to include", default=None)
+    parser.add_argument("--output", help="Output file (.csv or .parquet); CSV to stdout if omitted")
+    parser.add_argument("--bucket", help="date_bin interval for in-database aggregation, e.g. '15 minutes'")
+    parser.add_argument("--agg", choices=sorted(EXPORT_AGGS), default="avg")
+    parser.add_argument("--lttb", type=int, help="Downsample each series to about N points on the client (LTTB)")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--reconcile", help="Expected readings to audit: CSV file, ingest capture file or local store directory")
+    parser.add_argument("--config", help="PLC variable config used to decode captures and local store", default="plc_config.json")
+    parser.add_argument("--tolerance-ms", type=float, default=1.0, help="Timestamp tolerance when matching readings")
+    parser.add_argument("--all", action="store_true", help="Also report sensor/hours without issues")
+    parser.add_argument("--advise-partitioning", action="store_true", help="Recommend (and with --write apply) time partitioning and BRIN indexes")
+    parser.add_argument("--partition-table", default="sensor_valor")
+    parser.add_argument("--partition-column", default="fecha")
+    parser.add_argument("--partition-interval", choices=["day", "week", "month"], default="month")
+    parser.add_argument("--premake", type=int, default=3, help="Number of future partitions to keep created")
+    parser.add_argument("--min-rows", type=int, default=5000000, help="Estimated rows above which partitioning is recommended")
+    parser.add_argument("--batch-days", type=int, default=1, help="Days of data per copy batch when converting")
+    parser.add_argument("--hot-queries", action="store_true", help="Rank pg_stat_statements entries touching --schema")
+    parser.add_argument("--order", choices=["total", "mean", "calls", "rows", "reads"], default="total")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--sample-seconds", type=float, help="Diff two snapshots taken this many seconds apart")
     args = get_arg_or_env(parser)
     try:
         conn = connect(args)
@@ -378,6 +1352,96 @@ def main():
             verify_sensor_valor(conn, schema, args.id_fundo, args.id_sensorlocalizacion, args.id_metrica, fecha)
             conn.close()
             sys.exit(0)
+        if args.export:
+            schema = args.schema or 'thermo'
+            try:
+                desde = parse_fecha(args.desde) if args.desde else None
+                hasta = parse_fecha(args.hasta) if args.hasta else datetime.now(timezone.utc)
+            except Exception:
+                print("Fecha inválida; use ISO 8601", file=sys.stderr)
+                sys.exit(4)
+            if desde is None:
+                print("Faltan parámetros para exportación: --desde", file=sys.stderr)
+                sys.exit(4)
+            sensores = [int(x) for x in args.sensores.split(',') if x.strip()] if args.sensores else None
+            q, params, columns = export_query(conn, schema, args.export, desde, hasta, sensores, args.id_fundo, args.id_metrica, args.bucket, args.agg, by_series=bool(args.lttb))
+            chunks = stream_query(conn, q, params, args.chunk_size)
+            if args.lttb:
+                chunks = lttb_rows(chunks, len(columns) - 2, desde, hasta, args.lttb)
+            n = export_rows(chunks, columns, args.output)
+            conn.rollback()
+            print(f"Exportadas {n} filas de {schema}.{args.export}", file=sys.stderr)
+            conn.close()
+            sys.exit(0)
+        if args.reconcile:
+            schema = args.schema or 'thermo'
+            try:
+                desde = parse_fecha(args.desde) if args.desde else None
+                hasta = parse_fecha(args.hasta) if args.hasta else None
+            except Exception:
+                print("Fecha inválida; use ISO 8601", file=sys.stderr)
+                sys.exit(4)
+            expected = load_expected(args.reconcile, args.config, desde, hasta)
+            rows, n = reconcile(conn, schema, expected, timedelta(milliseconds=args.tolerance_ms))
+            keys = ["esperadas", "faltantes", "duplicadas", "con_error", "sin_propagar"]
+            totals = {k: sum(r[k] for r in rows) for k in keys}
+            print(f"Lecturas esperadas: {n}; " + ", ".join(f"{k}={totals[k]}" for k in keys[1:]), file=sys.stderr)
+            if not args.all:
+                rows = [r for r in rows if any(r[k] for k in keys[1:])]
+            columns = ["id_sensorlocalizacion", "id_metrica", "hora"] + keys
+            export_rows(iter([[[r[c] for c in columns] for r in rows]]), columns, args.output)
+            conn.close()
+            sys.exit(0)
+        if args.advise_partitioning:
+            schema = args.schema or 'thermo'
+            notes, steps = plan_partitioning(conn, schema, args.partition_table, args.partition_column, args.partition_interval, args.premake, args.min_rows, args.batch_days)
+            print(f"{schema}.{args.partition_table}:")
+            for n in notes:
+                print(f"  - {n}")
+            if not steps:
+                print("  Sin cambios recomendados.")
+            elif not args.write:
+                print("  Pasos recomendados (use --write para aplicarlos):")
+                for i, st in enumerate(steps, 1):
+                    print(f"  [{i}/{len(steps)}] {st['desc']}")
+                    for q in st["sql"]:
+                        print(f"        {q};")
+            else:
+                print("  Aplicando:")
+                ok = apply_steps(conn, steps)
+                conn.close()
+                sys.exit(0 if ok else 3)
+            conn.close()
+            sys.exit(0)
+        if args.hot_queries:
+            schema = args.schema or 'thermo'
+            ext_schema = pg_stat_statements_schema(conn)
+            if not ext_schema:
+                print("La extensión pg_stat_statements no está instalada en esta base", file=sys.stderr)
+                conn.close()
+                sys.exit(5)
+            cur = conn.cursor()
+            try:
+                cur.execute("SELECT current_setting('pg_stat_statements.track', true)")
+                track = cur.fetchone()[0]
+            finally:
+                cur.close()
+            if track and track != 'all':
+                print(f"pg_stat_statements.track={track}: las sentencias ejecutadas por triggers no se registran", file=sys.stderr)
+            stats = snapshot_statements(conn, ext_schema, schema)
+            if args.sample_seconds:
+                t0 = time.monotonic()
+                time.sleep(args.sample_seconds)
+                after = snapshot_statements(conn, ext_schema, schema)
+                seconds = time.monotonic() - t0
+                stats = diff_statements(stats, after)
+                print(f"Sentencias sobre {schema} en {seconds:.1f}s, ordenadas por {args.order}:")
+            else:
+                seconds = None
+                print(f"Sentencias sobre {schema} desde el último reset, ordenadas por {args.order}:")
+            print_statements(rank_statements(stats, args.order, args.limit), seconds, args.detail)
+            conn.close()
+            sys.exit(0)
         schemas = list_schemas(conn, args.schema)
         if not schemas:
             print("No se encontraron esquemas.")
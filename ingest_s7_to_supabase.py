@@ -2,13 +2,12 @@ import os
 import sys
 import argparse
 import ssl
-import json
-import csv
 import time
 from datetime import datetime, timezone
 import pg8000.dbapi as pg
 import snap7
-from snap7.util import get_bool, get_int, get_dint, get_real, get_word, get_dword
+from tsstore import LocalStore
+from s7data import load_config, block_key, store_name, decode_blocks, row_ids, CaptureWriter, read_capture
 
 
 def get_arg_or_env(parser):
@@ -25,6 +24,9 @@ def get_arg_or_env(parser):
     p.slot = p.slot if p.slot is not None else int(os.getenv("PLC_SLOT") or 0)
     p.config = getattr(p, "config", None) or os.getenv("PLC_CONFIG") or "plc_config.json"
     p.interval = p.interval if p.interval is not None else int(os.getenv("INGEST_INTERVAL_SEC") or 120)
+    p.local_store = p.local_store or os.getenv("LOCAL_STORE_DIR") or None
+    p.screen = p.screen or (os.getenv("INGEST_SCREEN") or "").lower() in ("1", "true", "yes")
+    p.local_retention_hours = p.local_retention_hours if p.local_retention_hours is not None else float(os.getenv("LOCAL_STORE_RETENTION_H") or 24)
     missing = [k for k in ["db_host", "db_port", "db_name", "db_user", "db_password"] if getattr(p, k, None) in (None, "")]
     if missing:
         print("Faltan parámetros: " + ", ".join(missing), file=sys.stderr)
@@ -71,91 +73,145 @@ def insert_sensor_valor(conn, schema, id_fundo, id_sensorlocalizacion, id_metric
         cur.close()
 
 
+def insert_sensor_valor_many(conn, schema, rows):
+    q = f"""
+    INSERT INTO {schema}.sensor_valor (id_fundo, id_sensorlocalizacion, id_metrica, valor, fecha)
+    SELECT * FROM unnest(%s::bigint[], %s::bigint[], %s::bigint[], %s::float8[], %s::timestamptz[])
+    """
+    cols = [list(c) for c in zip(*rows)]
+    cur = conn.cursor()
+    try:
+        cur.execute(q, cols)
+        conn.commit()
+    finally:
+        cur.close()
+
+
+def insert_sensor_valor_error_many(conn, schema, rows):
+    q = f"""
+    INSERT INTO {schema}.sensor_valor_error (error, id_fundo, id_sensorlocalizacion, id_metrica, valor, fecha)
+    SELECT * FROM unnest(%s::text[], %s::bigint[], %s::bigint[], %s::bigint[], %s::float8[], %s::timestamptz[])
+    """
+    cols = [list(c) for c in zip(*rows)]
+    cur = conn.cursor()
+    try:
+        cur.execute(q, cols)
+        conn.commit()
+    finally:
+        cur.close()
+
+
 def connect_plc(ip, rack, slot):
     c = snap7.client.Client()
     c.connect(ip, rack, slot)
     return c
 
 
-def parse_value(t, data, bit=None):
-    tt = t.upper()
-    if tt == "REAL":
-        return float(get_real(data, 0))
-    if tt == "INT":
-        return int(get_int(data, 0))
-    if tt == "DINT":
-        return int(get_dint(data, 0))
-    if tt == "WORD":
-        return int(get_word(data, 0))
-    if tt == "DWORD":
-        return int(get_dword(data, 0))
-    if tt == "BOOL":
-        b = int(bit or 0)
-        return 1.0 if get_bool(data, 0, b) else 0.0
-    raise ValueError("Tipo no soportado: " + t)
-
-
-def type_size(t):
-    tt = t.upper()
-    if tt in ("REAL", "DINT", "DWORD"):
-        return 4
-    if tt in ("INT", "WORD"):
-        return 2
-    if tt == "BOOL":
-        return 1
-    raise ValueError("Tipo no soportado: " + t)
-
-
-def load_config(path):
-    if path.lower().endswith(".json"):
-        with open(path, "r", encoding="utf-8") as f:
-            cfg = json.load(f)
-            vars_list = cfg.get("variables") or []
-            return vars_list
-    if path.lower().endswith(".csv"):
-        out = []
-        with open(path, newline="", encoding="utf-8") as f:
-            r = csv.DictReader(f)
-            for row in r:
-                out.append({
-                    "name": row.get("name"),
-                    "db": int(row.get("db") or row.get("db_number") or 1),
-                    "offset": int(row.get("offset") or 0),
-                    "type": row.get("type") or "REAL",
-                    "bit": int(row.get("bit") or 0),
-                    "id_fundo": int(row.get("id_fundo") or 0),
-                    "id_sensorlocalizacion": int(row.get("id_sensorlocalizacion") or 0),
-                    "id_metrica": int(row.get("id_metrica") or 0),
-                    "scale": float(row.get("scale") or 1.0),
-                    "bias": float(row.get("bias") or 0.0),
-                })
-        return out
-    raise ValueError("Extensión de archivo no soportada")
-
-
-def read_and_ingest_once(args, conn, plc, variables):
-    schema = args.schema or "thermo"
-    now = datetime.now(timezone.utc)
+def read_blocks(plc, variables):
+    blocks = {}
     for v in variables:
         try:
-            dbn = int(v.get("db") or v.get("db_number") or 1)
-            off = int(v.get("offset") or 0)
-            t = v.get("type") or "REAL"
-            sz = type_size(t)
-            data = plc.db_read(dbn, off, sz)
-            val = parse_value(t, data, v.get("bit"))
-            sc = float(v.get("scale") or 1.0)
-            bs = float(v.get("bias") or 0.0)
-            val = float(val) * sc + bs
-            id_fundo = int(v.get("id_fundo"))
-            id_sensorlocalizacion = int(v.get("id_sensorlocalizacion"))
-            id_metrica = int(v.get("id_metrica"))
+            key = block_key(v)
+            if key in blocks:
+                continue
+            blocks[key] = None
+            blocks[key] = bytes(plc.db_read(*key))
+        except Exception as e:
+            print(f"ERROR {v.get('name') or ''}: {e}", file=sys.stderr)
+    return blocks
+
+
+def write_screened(conn, schema, screened, now):
+    ok_rows = []
+    err_rows = []
+    for v, val, error in screened:
+        try:
+            ids = row_ids(v)
+        except Exception as e:
+            print(f"ERROR {v.get('name') or ''}: {e}", file=sys.stderr)
+            continue
+        if error:
+            print(f"DESCARTADO {v.get('name') or ''}: {error} valor={val}", file=sys.stderr)
+            err_rows.append((error,) + ids + (val, now))
+        else:
+            ok_rows.append(ids + (val, now))
+    for rows, writer, table in ((ok_rows, insert_sensor_valor_many, "sensor_valor"), (err_rows, insert_sensor_valor_error_many, "sensor_valor_error")):
+        if not rows:
+            continue
+        try:
+            writer(conn, schema, rows)
+            print(f"OK {len(rows)} filas -> {schema}.{table} @ {now.isoformat()}")
+        except Exception as e:
+            print(f"ERROR inserción en lote {schema}.{table}: {e}; reintentando fila a fila", file=sys.stderr)
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            for r in rows:
+                try:
+                    writer(conn, schema, [r])
+                except Exception as e2:
+                    print(f"ERROR {schema}.{table} {r}: {e2}", file=sys.stderr)
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        pass
+
+
+def ingest_blocks(args, conn, variables, blocks, now, store=None, screener=None):
+    schema = args.schema or "thermo"
+    rows = decode_blocks(variables, blocks)
+    if store is not None:
+        for v, val in rows:
+            try:
+                store.append(store_name(v), now, val)
+            except Exception as e:
+                print(f"ERROR almacenamiento local {v.get('name') or ''}: {e}", file=sys.stderr)
+        try:
+            store.flush()
+        except Exception as e:
+            print(f"ERROR almacenamiento local: {e}", file=sys.stderr)
+    if screener is not None:
+        write_screened(conn, schema, screener.screen(rows, now), now)
+        return
+    for v, val in rows:
+        try:
+            id_fundo, id_sensorlocalizacion, id_metrica = row_ids(v)
             insert_sensor_valor(conn, schema, id_fundo, id_sensorlocalizacion, id_metrica, val, now)
             print(f"OK {v.get('name') or ''} -> {schema}.sensor_valor {id_fundo},{id_sensorlocalizacion},{id_metrica}={val} @ {now.isoformat()}")
         except Exception as e:
             print(f"ERROR {v.get('name') or ''}: {e}", file=sys.stderr)
 
 
+def read_and_ingest_once(args, conn, plc, variables, store=None, capture=None, screener=None):
+    now = datetime.now(timezone.utc)
+    blocks = read_blocks(plc, variables)
+    if capture is not None:
+        try:
+            capture.write(now, blocks)
+        except Exception as e:
+            print(f"ERROR captura: {e}", file=sys.stderr)
+    ingest_blocks(args, conn, variables, blocks, now, store, screener)
+
+
+def replay_capture(args, conn, variables, store=None, screener=None):
+    speed = args.replay_speed if args.replay_speed is not None else 1.0
+    first = None
+    t0 = time.monotonic()
+    frames = 0
+    for now, blocks in read_capture(args.replay):
+        if first is None:
+            first = now
+        if speed > 0:
+            wait = (now - first).total_seconds() / speed - (time.monotonic() - t0)
+            if wait > 0:
+                time.sleep(wait)
+        ingest_blocks(args, conn, variables, blocks, now, store, screener)
+        frames += 1
+    elapsed = time.monotonic() - t0
+    print(f"Replay completado: {frames} frames en {elapsed:.1f}s")
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--db-host")
@@ -170,34 +226,70 @@ def main():
     parser.add_argument("--slot", type=int)
     parser.add_argument("--config")
     parser.add_argument("--interval", type=int)
+    parser.add_argument("--local-store", help="Directorio del histórico local comprimido")
+    parser.add_argument("--local-retention-hours", type=float)
+    parser.add_argument("--capture", help="Archivo donde grabar los bloques crudos leídos del PLC")
+    parser.add_argument("--replay", help="Archivo de captura a reproducir sin PLC")
+    parser.add_argument("--replay-speed", type=float, help="Multiplicador de velocidad (1 = tiempo real, 0 = máxima)")
+    parser.add_argument("--screen", action="store_true", help="Filtrar lecturas inválidas antes de escribir en la DB")
     args = get_arg_or_env(parser)
+    Screener = None
+    if args.screen:
+        try:
+            from screening import Screener
+        except ImportError:
+            print("Falta dependencia: numpy. Instala con: pip install numpy", file=sys.stderr)
+            sys.exit(1)
     try:
         conn = connect_db(args)
     except Exception as e:
         print(f"Error de conexión DB: {e}", file=sys.stderr)
         sys.exit(2)
-    try:
-        plc = connect_plc(args.plc_ip, args.rack, args.slot)
-    except Exception as e:
-        print(f"Error de conexión PLC: {e}", file=sys.stderr)
+    plc = None
+    if not args.replay:
         try:
-            conn.close()
-        except Exception:
-            pass
-        sys.exit(2)
+            plc = connect_plc(args.plc_ip, args.rack, args.slot)
+        except Exception as e:
+            print(f"Error de conexión PLC: {e}", file=sys.stderr)
+            try:
+                conn.close()
+            except Exception:
+                pass
+            sys.exit(2)
+    store = None
+    capture = None
     try:
         variables = load_config(args.config)
+        screener = Screener(variables) if Screener else None
+        if args.local_store:
+            store = LocalStore(args.local_store, retention_hours=args.local_retention_hours)
+        if args.replay:
+            replay_capture(args, conn, variables, store, screener)
+            return
+        if args.capture:
+            capture = CaptureWriter(args.capture)
         if args.interval and args.interval > 0:
             while True:
-                read_and_ingest_once(args, conn, plc, variables)
+                read_and_ingest_once(args, conn, plc, variables, store, capture, screener)
                 time.sleep(args.interval)
         else:
-            read_and_ingest_once(args, conn, plc, variables)
+            read_and_ingest_once(args, conn, plc, variables, store, capture, screener)
     finally:
-        try:
-            plc.disconnect()
-        except Exception:
-            pass
+        if capture is not None:
+            try:
+                capture.close()
+            except Exception:
+                pass
+        if store is not None:
+            try:
+                store.close()
+            except Exception:
+                pass
+        if plc is not None:
+            try:
+                plc.disconnect()
+            except Exception:
+                pass
         try:
             conn.close()
         except Exception:
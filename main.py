@@ -1,3 +1,7 @@
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from kivy.app import App
 from kivy.uix.label import Label
 from kivy.clock import Clock
@@ -17,48 +21,111 @@ class Runnable(PythonJavaClass):
         self.func()
 
 
+def java_bytes(arr):
+    if arr is None:
+        return b''
+    if isinstance(arr, (bytes, bytearray)):
+        return bytes(arr)
+    tostring = getattr(arr, 'tostring', None)
+    if tostring is not None:
+        return tostring()
+    return struct.pack('%db' % len(arr), *arr)
+
+
+def parse_ndef(raw):
+    text = None
+    uri = None
+    i = 0
+    n = len(raw)
+    while i + 2 <= n:
+        hdr = raw[i]
+        type_len = raw[i + 1]
+        i += 2
+        if hdr & 0x10:
+            p_len = raw[i]
+            i += 1
+        else:
+            p_len = int.from_bytes(raw[i:i + 4], 'big')
+            i += 4
+        id_len = 0
+        if hdr & 0x08:
+            id_len = raw[i]
+            i += 1
+        t_b = raw[i:i + type_len]
+        i += type_len + id_len
+        p_b = raw[i:i + p_len]
+        i += p_len
+        if t_b == b'T' and len(p_b) > 1:
+            lang_len = p_b[0] & 0x3F
+            text = p_b[1+lang_len:].decode('utf-8', 'ignore')
+        elif t_b == b'U' and len(p_b) > 1 and uri is None:
+            uri = p_b[1:].decode('utf-8', 'ignore')
+        if hdr & 0x40:
+            break
+    return text, uri
+
+
 class ReaderCallback(PythonJavaClass):
     __javainterfaces__ = ['android/nfc/NfcAdapter$ReaderCallback']
     __javacontext__ = 'app'
 
-    def __init__(self, on_tag):
+    def __init__(self, on_tag, cache_sec=3.0):
         super().__init__()
         self.on_tag = on_tag
         self.Ndef = autoclass('android.nfc.tech.Ndef')
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.cache_sec = cache_sec
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def post(self, info):
+        Clock.schedule_once(lambda dt: self.on_tag(info))
+
+    def cached(self, uid_hex, now):
+        with self.lock:
+            hit = self.cache.get(uid_hex)
+            if len(self.cache) > 64:
+                self.cache = {k: v for k, v in self.cache.items() if now - v[0] < self.cache_sec}
+        if hit and now - hit[0] < self.cache_sec:
+            return hit[1]
+        return None
+
+    def parse(self, uid_hex, raw):
+        try:
+            text, uri = parse_ndef(raw)
+            info = {'uid': uid_hex, 'text': text, 'uri': uri}
+            with self.lock:
+                self.cache[uid_hex] = (time.monotonic(), info)
+            self.post(info)
+        except Exception as e:
+            self.post({'error': str(e)})
 
     @java_method('(Landroid/nfc/Tag;)V')
     def onTagDiscovered(self, tag):
         try:
-            uid_arr = tag.getId()
-            uid_hex = ''.join(['%02X' % (uid_arr[i] & 0xFF) for i in range(len(uid_arr))])
-            text = None
-            uri = None
+            uid_hex = java_bytes(tag.getId()).hex().upper()
+            info = self.cached(uid_hex, time.monotonic())
+            if info is not None:
+                self.post(info)
+                return
+            raw = b''
             ndef = self.Ndef.get(tag)
             if ndef:
-                try:
-                    ndef.connect()
-                    msg = ndef.getNdefMessage()
-                    if msg:
-                        recs = msg.getRecords()
-                        for r in recs:
-                            t = r.getType()
-                            t_b = bytes([(t[i] & 0xFF) for i in range(len(t))])
-                            payload = r.getPayload()
-                            p_b = bytes([(payload[i] & 0xFF) for i in range(len(payload))])
-                            if t_b == b'T' and len(p_b) > 1:
-                                lang_len = p_b[0] & 0x3F
-                                text = p_b[1+lang_len:].decode('utf-8', 'ignore')
-                            elif t_b == b'U' and len(p_b) > 1 and uri is None:
-                                uri = p_b[1:].decode('utf-8', 'ignore')
-                finally:
+                msg = ndef.getCachedNdefMessage()
+                if msg is None:
                     try:
-                        ndef.close()
-                    except Exception:
-                        pass
-            info = {'uid': uid_hex, 'text': text, 'uri': uri}
-            Clock.schedule_once(lambda dt: self.on_tag(info))
+                        ndef.connect()
+                        msg = ndef.getNdefMessage()
+                    finally:
+                        try:
+                            ndef.close()
+                        except Exception:
+                            pass
+                if msg:
+                    raw = java_bytes(msg.toByteArray())
+            self.executor.submit(self.parse, uid_hex, raw)
         except Exception as e:
-            Clock.schedule_once(lambda dt: self.on_tag({'error': str(e)}))
+            self.post({'error': str(e)})
 
 
 class NFCApp(App):
@@ -95,7 +162,8 @@ class NFCApp(App):
             | NfcAdapter.FLAG_READER_NFC_V
             | NfcAdapter.FLAG_READER_NO_PLATFORM_SOUNDS
         )
-        self._callback = ReaderCallback(self.on_tag_read)
+        if getattr(self, '_callback', None) is None:
+            self._callback = ReaderCallback(self.on_tag_read)
         activity.runOnUiThread(Runnable(lambda: adapter.enableReaderMode(activity, self._callback, flags, None)))
 
     def disable_reader_mode(self):
@@ -0,0 +1,153 @@
+import sys
+import json
+import csv
+import struct
+from datetime import datetime, timezone
+
+
+# Los datos de un DB S7 son big-endian
+S7_FORMATS = {
+    "REAL": struct.Struct(">f"),
+    "INT": struct.Struct(">h"),
+    "DINT": struct.Struct(">i"),
+    "WORD": struct.Struct(">H"),
+    "DWORD": struct.Struct(">I"),
+}
+
+
+def parse_value(t, data, bit=None):
+    tt = t.upper()
+    if tt == "BOOL":
+        b = int(bit or 0)
+        return 1.0 if data[0] & (1 << b) else 0.0
+    fmt = S7_FORMATS.get(tt)
+    if fmt is None:
+        raise ValueError("Tipo no soportado: " + t)
+    v = fmt.unpack_from(data, 0)[0]
+    return float(v) if tt == "REAL" else int(v)
+
+
+def type_size(t):
+    tt = t.upper()
+    if tt in ("REAL", "DINT", "DWORD"):
+        return 4
+    if tt in ("INT", "WORD"):
+        return 2
+    if tt == "BOOL":
+        return 1
+    raise ValueError("Tipo no soportado: " + t)
+
+
+def load_config(path):
+    if path.lower().endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+            vars_list = cfg.get("variables") or []
+            return vars_list
+    if path.lower().endswith(".csv"):
+        out = []
+        with open(path, newline="", encoding="utf-8") as f:
+            r = csv.DictReader(f)
+            for row in r:
+                out.append({
+                    "name": row.get("name"),
+                    "db": int(row.get("db") or row.get("db_number") or 1),
+                    "offset": int(row.get("offset") or 0),
+                    "type": row.get("type") or "REAL",
+                    "bit": int(row.get("bit") or 0),
+                    "id_fundo": int(row.get("id_fundo") or 0),
+                    "id_sensorlocalizacion": int(row.get("id_sensorlocalizacion") or 0),
+                    "id_metrica": int(row.get("id_metrica") or 0),
+                    "scale": float(row.get("scale") or 1.0),
+                    "bias": float(row.get("bias") or 0.0),
+                })
+        return out
+    raise ValueError("Extensión de archivo no soportada")
+
+
+def block_key(v):
+    dbn = int(v.get("db") or v.get("db_number") or 1)
+    off = int(v.get("offset") or 0)
+    sz = type_size(v.get("type") or "REAL")
+    return (dbn, off, sz)
+
+
+def store_name(v):
+    return v.get("name") or "db{}_{}".format(*block_key(v))
+
+
+def decode_blocks(variables, blocks):
+    rows = []
+    for v in variables:
+        try:
+            key = block_key(v)
+            if key not in blocks:
+                raise ValueError(f"sin datos para DB{key[0]}.{key[1]}")
+            data = blocks[key]
+            if data is None:
+                continue
+            val = parse_value(v.get("type") or "REAL", bytearray(data), v.get("bit"))
+            sc = float(v.get("scale") or 1.0)
+            bs = float(v.get("bias") or 0.0)
+            rows.append((v, float(val) * sc + bs))
+        except Exception as e:
+            print(f"ERROR {v.get('name') or ''}: {e}", file=sys.stderr)
+    return rows
+
+
+def row_ids(v):
+    return int(v.get("id_fundo")), int(v.get("id_sensorlocalizacion")), int(v.get("id_metrica"))
+
+
+# Formato de captura: cabecera CAPTURE_MAGIC y luego frames
+# (ts_ms int64, n_bloques uint16) seguidos de n bloques (db uint16, offset uint32, size uint16, ok uint8, bytes);
+# ok = 0 marca una lectura fallida y no lleva bytes.
+CAPTURE_MAGIC = b"S7CAP1\n"
+FRAME_HDR = struct.Struct(">qH")
+BLOCK_HDR = struct.Struct(">HIHB")
+
+
+class CaptureWriter:
+    def __init__(self, path):
+        self.f = open(path, "ab")
+        if self.f.tell() == 0:
+            self.f.write(CAPTURE_MAGIC)
+
+    def write(self, now, blocks):
+        parts = [FRAME_HDR.pack(int(round(now.timestamp() * 1000)), len(blocks))]
+        for (dbn, off, sz), data in blocks.items():
+            if data is None:
+                parts.append(BLOCK_HDR.pack(dbn, off, sz, 0))
+            else:
+                parts.append(BLOCK_HDR.pack(dbn, off, sz, 1))
+                parts.append(data)
+        self.f.write(b"".join(parts))
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+def read_capture(path):
+    with open(path, "rb") as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError("Archivo de captura inválido")
+        while True:
+            hdr = f.read(FRAME_HDR.size)
+            if len(hdr) < FRAME_HDR.size:
+                return
+            ts_ms, n = FRAME_HDR.unpack(hdr)
+            blocks = {}
+            for _ in range(n):
+                bh = f.read(BLOCK_HDR.size)
+                if len(bh) < BLOCK_HDR.size:
+                    return
+                dbn, off, sz, ok = BLOCK_HDR.unpack(bh)
+                if not ok:
+                    blocks[(dbn, off, sz)] = None
+                    continue
+                data = f.read(sz)
+                if len(data) < sz:
+                    return
+                blocks[(dbn, off, sz)] = data
+            yield datetime.fromtimestamp(ts_ms / 1000.0, tz=timezone.utc), blocks
@@ -0,0 +1,101 @@
+import numpy as np
+
+
+# Claves opcionales por variable en plc_config.json:
+#   min, max       límites del valor ya escalado
+#   max_rate       cambio máximo permitido en unidades por segundo
+#   rate_reset_samples  lecturas consecutivas estables fuera de max_rate que se aceptan
+#                  como un escalón real y pasan a ser la nueva referencia (3 por defecto)
+#   stuck_samples  lecturas idénticas consecutivas que marcan un valor pegado
+#   sentinels      lista de valores que el PLC usa para sonda desconectada
+class Screener:
+    def __init__(self, variables):
+        n = len(variables)
+        self.index = {id(v): i for i, v in enumerate(variables)}
+        self.vmin = np.full(n, -np.inf)
+        self.vmax = np.full(n, np.inf)
+        self.max_rate = np.full(n, np.inf)
+        self.stuck_n = np.zeros(n, dtype=np.int64)
+        self.reset_n = np.full(n, 3, dtype=np.int64)
+        width = max([len(v.get("sentinels") or []) for v in variables] + [1])
+        self.sentinels = np.full((n, width), np.nan)
+        for i, v in enumerate(variables):
+            if v.get("min") is not None:
+                self.vmin[i] = float(v["min"])
+            if v.get("max") is not None:
+                self.vmax[i] = float(v["max"])
+            if v.get("max_rate") is not None:
+                self.max_rate[i] = float(v["max_rate"])
+            if v.get("rate_reset_samples"):
+                self.reset_n[i] = int(v["rate_reset_samples"])
+            if v.get("stuck_samples"):
+                self.stuck_n[i] = int(v["stuck_samples"])
+            for j, s in enumerate(v.get("sentinels") or []):
+                self.sentinels[i, j] = float(s)
+        self.prev = np.full(n, np.nan)
+        self.prev_t = np.full(n, np.nan)
+        self.repeats = np.zeros(n, dtype=np.int64)
+        self.last = np.full(n, np.nan)
+        self.fast_val = np.full(n, np.nan)
+        self.fast_t = np.full(n, np.nan)
+        self.fast_run = np.zeros(n, dtype=np.int64)
+
+    def screen(self, rows, now):
+        if not rows:
+            return []
+        idx = np.fromiter((self.index[id(v)] for v, _ in rows), dtype=np.int64, count=len(rows))
+        vals = np.fromiter((val for _, val in rows), dtype=np.float64, count=len(rows))
+        t = now.timestamp()
+
+        nonfinite = ~np.isfinite(vals)
+        sentinel = (self.sentinels[idx] == vals[:, None]).any(axis=1)
+        with np.errstate(invalid="ignore"):
+            low = vals < self.vmin[idx]
+            high = vals > self.vmax[idx]
+            prev = self.prev[idx]
+            dt = t - self.prev_t[idx]
+            rate = np.abs(vals - prev) / np.where(dt > 0, dt, np.nan)
+            too_fast = np.isfinite(rate) & (rate > self.max_rate[idx])
+
+        repeats = np.where(vals == self.last[idx], self.repeats[idx] + 1, 0)
+        self.repeats[idx] = repeats
+        self.last[idx] = vals
+        stuck = (self.stuck_n[idx] > 0) & (repeats + 1 >= self.stuck_n[idx])
+
+        invalid = nonfinite | sentinel | low | high
+        bad = invalid | too_fast | stuck
+        good = ~bad
+        self.prev[idx[good]] = vals[good]
+        self.prev_t[idx[good]] = t
+
+        # Escalón real: varias lecturas seguidas fuera de max_rate respecto a la referencia
+        # pero coherentes entre sí reemplazan la referencia
+        step = too_fast & ~invalid
+        with np.errstate(invalid="ignore"):
+            fdt = t - self.fast_t[idx]
+            frate = np.abs(vals - self.fast_val[idx]) / np.where(fdt > 0, fdt, np.nan)
+            steady = np.isfinite(frate) & (frate <= self.max_rate[idx])
+        fast_run = np.where(step, np.where(steady, self.fast_run[idx] + 1, 1), 0)
+        rebase = step & (fast_run >= self.reset_n[idx])
+        fast_run[rebase] = 0
+        self.fast_run[idx] = fast_run
+        self.fast_val[idx[step]] = vals[step]
+        self.fast_t[idx[step]] = t
+        self.prev[idx[rebase]] = vals[rebase]
+        self.prev_t[idx[rebase]] = t
+
+        checks = (
+            (nonfinite, "nan_inf"),
+            (sentinel, "sentinela"),
+            (low, "bajo_minimo"),
+            (high, "sobre_maximo"),
+            (too_fast, "tasa_cambio"),
+            (stuck, "valor_pegado"),
+        )
+        out = []
+        for k, (v, val) in enumerate(rows):
+            if bad[k]:
+                out.append((v, val, ",".join(label for mask, label in checks if mask[k])))
+            else:
+                out.append((v, val, None))
+        return out
@@ -0,0 +1,381 @@
+import os
+import sys
+import struct
+import argparse
+import math
+from datetime import datetime, timezone
+from urllib.parse import quote, unquote
+
+
+CHUNK_MAGIC = b"TSC1"
+CHUNK_SUFFIX = ".tsc"
+
+
+class BitWriter:
+    def __init__(self):
+        self.buf = bytearray()
+        self.acc = 0
+        self.nbits = 0
+
+    def write(self, value, nbits):
+        self.acc = (self.acc << nbits) | (value & ((1 << nbits) - 1))
+        self.nbits += nbits
+        while self.nbits >= 8:
+            self.nbits -= 8
+            self.buf.append((self.acc >> self.nbits) & 0xFF)
+        self.acc &= (1 << self.nbits) - 1
+
+    def getvalue(self):
+        if self.nbits:
+            return bytes(self.buf) + bytes([(self.acc << (8 - self.nbits)) & 0xFF])
+        return bytes(self.buf)
+
+
+class BitReader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+        self.size = len(data) * 8
+
+    def read(self, nbits):
+        end = self.pos + nbits
+        if end > self.size:
+            raise ValueError("Chunk truncado")
+        first = self.pos >> 3
+        last = (end + 7) >> 3
+        v = int.from_bytes(self.data[first:last], "big")
+        self.pos = end
+        return (v >> ((last << 3) - end)) & ((1 << nbits) - 1)
+
+
+def float_bits(v):
+    return struct.unpack(">Q", struct.pack(">d", v))[0]
+
+
+def bits_float(b):
+    return struct.unpack(">d", struct.pack(">Q", b))[0]
+
+
+def signed(v, nbits):
+    if v >= 1 << (nbits - 1):
+        v -= 1 << nbits
+    return v
+
+
+# Rangos de delta-of-delta (ms): prefijo, bits de prefijo, bits de valor
+DOD_RANGES = [
+    (0b10, 2, 7),
+    (0b110, 3, 9),
+    (0b1110, 4, 12),
+]
+
+
+class ChunkEncoder:
+    def __init__(self):
+        self.bw = BitWriter()
+        self.count = 0
+        self.last_ts = None
+        self.last_delta = 0
+        self.last_bits = 0
+        self.lead = -1
+        self.trail = 0
+
+    def append(self, ts, value):
+        bw = self.bw
+        vb = float_bits(float(value))
+        if self.count == 0:
+            bw.write(ts, 64)
+            bw.write(vb, 64)
+        else:
+            delta = ts - self.last_ts
+            dod = delta - self.last_delta
+            if dod == 0:
+                bw.write(0, 1)
+            else:
+                for prefix, plen, vlen in DOD_RANGES:
+                    if -(1 << (vlen - 1)) <= dod < (1 << (vlen - 1)):
+                        bw.write(prefix, plen)
+                        bw.write(dod, vlen)
+                        break
+                else:
+                    bw.write(0b1111, 4)
+                    bw.write(dod, 64)
+            self.last_delta = delta
+            x = vb ^ self.last_bits
+            if x == 0:
+                bw.write(0, 1)
+            else:
+                lead = min(64 - x.bit_length(), 31)
+                trail = (x & -x).bit_length() - 1
+                if self.lead >= 0 and lead >= self.lead and trail >= self.trail:
+                    bw.write(0b10, 2)
+                    bw.write(x >> self.trail, 64 - self.lead - self.trail)
+                else:
+                    sig = 64 - lead - trail
+                    bw.write(0b11, 2)
+                    bw.write(lead, 5)
+                    bw.write(sig - 1, 6)
+                    bw.write(x >> trail, sig)
+                    self.lead = lead
+                    self.trail = trail
+        self.last_ts = ts
+        self.last_bits = vb
+        self.count += 1
+
+    def getvalue(self):
+        return CHUNK_MAGIC + struct.pack(">I", self.count) + self.bw.getvalue()
+
+
+def decode_chunk(data):
+    if data[:4] != CHUNK_MAGIC:
+        raise ValueError("Formato de chunk desconocido")
+    (count,) = struct.unpack(">I", data[4:8])
+    out = []
+    if count == 0:
+        return out
+    br = BitReader(data[8:])
+    ts = signed(br.read(64), 64)
+    vb = br.read(64)
+    out.append((ts, bits_float(vb)))
+    delta = 0
+    lead = 0
+    trail = 0
+    for _ in range(count - 1):
+        if br.read(1) == 0:
+            dod = 0
+        else:
+            for _prefix, plen, vlen in DOD_RANGES:
+                if br.read(1) == 0:
+                    dod = signed(br.read(vlen), vlen)
+                    break
+            else:
+                dod = signed(br.read(64), 64)
+        delta += dod
+        ts += delta
+        if br.read(1) == 1:
+            if br.read(1) == 1:
+                lead = br.read(5)
+                sig = br.read(6) + 1
+                trail = 64 - lead - sig
+            vb ^= br.read(64 - lead - trail) << trail
+        out.append((ts, bits_float(vb)))
+    return out
+
+
+def to_ms(t):
+    if isinstance(t, datetime):
+        if t.tzinfo is None:
+            t = t.replace(tzinfo=timezone.utc)
+        return int(round(t.timestamp() * 1000))
+    return int(t)
+
+
+def from_ms(ms):
+    return datetime.fromtimestamp(ms / 1000.0, tz=timezone.utc)
+
+
+# Codificación reversible del nombre de la variable como directorio, para que dos nombres
+# distintos nunca compartan chunks; un punto inicial se codifica para evitar "." y "..".
+def safe_name(name):
+    s = quote(str(name), safe="")
+    if not s:
+        raise ValueError("Nombre de variable vacío")
+    if s.startswith("."):
+        s = "%2E" + s[1:]
+    return s
+
+
+def downsample(points, step_ms, agg="avg"):
+    out = []
+    bucket = None
+    vals = []
+
+    def close():
+        if agg == "min":
+            v = min(vals)
+        elif agg == "max":
+            v = max(vals)
+        elif agg == "last":
+            v = vals[-1]
+        elif agg == "first":
+            v = vals[0]
+        else:
+            v = math.fsum(vals) / len(vals)
+        out.append((bucket, v))
+
+    for ts, v in points:
+        b = ts - ts % step_ms
+        if b != bucket:
+            if vals:
+                close()
+            bucket = b
+            vals = []
+        vals.append(v)
+    if vals:
+        close()
+    return out
+
+
+class LocalStore:
+    def __init__(self, root, block_sec=3600, retention_hours=24):
+        self.root = root
+        self.block_ms = int(block_sec) * 1000
+        self.retention_ms = int(retention_hours * 3600 * 1000) if retention_hours else 0
+        self.open_chunks = {}
+        self.dirty = set()
+        os.makedirs(root, exist_ok=True)
+
+    def chunk_path(self, name, block):
+        return os.path.join(self.root, safe_name(name), f"{block}{CHUNK_SUFFIX}")
+
+    def _load_open(self, name, block):
+        enc = ChunkEncoder()
+        path = self.chunk_path(name, block)
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    for ts, v in decode_chunk(f.read()):
+                        enc.append(ts, v)
+            except Exception as e:
+                print(f"ERROR chunk {path}: {e}", file=sys.stderr)
+                enc = ChunkEncoder()
+        return enc
+
+    def append(self, name, t, value):
+        ts = to_ms(t)
+        block = ts - ts % self.block_ms
+        cur = self.open_chunks.get(name)
+        if cur is None or cur[0] != block:
+            if cur is not None and name in self.dirty:
+                self._write(name, cur[0], cur[1])
+            cur = (block, self._load_open(name, block))
+            self.open_chunks[name] = cur
+        enc = cur[1]
+        if enc.count and ts <= enc.last_ts:
+            return
+        enc.append(ts, value)
+        self.dirty.add(name)
+
+    def _write(self, name, block, enc):
+        path = self.chunk_path(name, block)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(enc.getvalue())
+        os.replace(tmp, path)
+        self.dirty.discard(name)
+
+    def flush(self):
+        for name in list(self.dirty):
+            block, enc = self.open_chunks[name]
+            self._write(name, block, enc)
+        if self.retention_ms:
+            self.prune()
+
+    def close(self):
+        self.flush()
+        self.open_chunks.clear()
+
+    def blocks(self, name):
+        d = os.path.join(self.root, safe_name(name))
+        out = []
+        try:
+            entries = os.listdir(d)
+        except FileNotFoundError:
+            return out
+        for fn in entries:
+            if fn.endswith(CHUNK_SUFFIX):
+                try:
+                    out.append(int(fn[: -len(CHUNK_SUFFIX)]))
+                except ValueError:
+                    continue
+        out.sort()
+        return out
+
+    def names(self):
+        try:
+            return sorted(unquote(n) for n in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, n)))
+        except FileNotFoundError:
+            return []
+
+    def prune(self, now_ms=None):
+        now_ms = now_ms if now_ms is not None else to_ms(datetime.now(timezone.utc))
+        limit = now_ms - self.retention_ms
+        for n in self.names():
+            for b in self.blocks(n):
+                if b + self.block_ms <= limit:
+                    try:
+                        os.remove(self.chunk_path(n, b))
+                    except OSError:
+                        pass
+
+    def query(self, name, start=None, end=None, step_sec=None, agg="avg"):
+        start_ms = to_ms(start) if start is not None else None
+        end_ms = to_ms(end) if end is not None else None
+        cur = self.open_chunks.get(name)
+        blocks = set(self.blocks(name))
+        if cur is not None:
+            blocks.add(cur[0])
+        points = []
+        for b in sorted(blocks):
+            if start_ms is not None and b + self.block_ms <= start_ms:
+                continue
+            if end_ms is not None and b > end_ms:
+                break
+            if cur is not None and cur[0] == b:
+                data = cur[1].getvalue()
+            else:
+                with open(self.chunk_path(name, b), "rb") as f:
+                    data = f.read()
+            for ts, v in decode_chunk(data):
+                if start_ms is not None and ts < start_ms:
+                    continue
+                if end_ms is not None and ts > end_ms:
+                    break
+                points.append((ts, v))
+        if step_sec:
+            points = downsample(points, int(step_sec * 1000), agg)
+        return points
+
+
+def parse_time(s):
+    if s is None:
+        return None
+    if s.endswith('Z'):
+        s = s[:-1] + '+00:00'
+    t = datetime.fromisoformat(s)
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    return t
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dir")
+    parser.add_argument("--name", help="Variable a consultar; sin este parámetro lista las variables")
+    parser.add_argument("--desde")
+    parser.add_argument("--hasta")
+    parser.add_argument("--step", type=float, help="Segundos por bucket de downsampling")
+    parser.add_argument("--agg", choices=["avg", "min", "max", "first", "last"], default="avg")
+    args = parser.parse_args()
+    root = args.dir or os.getenv("LOCAL_STORE_DIR")
+    if not root or not os.path.isdir(root):
+        print("Directorio de almacenamiento local no encontrado", file=sys.stderr)
+        sys.exit(1)
+    store = LocalStore(root, retention_hours=0)
+    if not args.name:
+        for n in store.names():
+            print(n)
+        return
+    try:
+        desde = parse_time(args.desde)
+        hasta = parse_time(args.hasta)
+    except Exception:
+        print("Fecha inválida; use ISO 8601", file=sys.stderr)
+        sys.exit(4)
+    for ts, v in store.query(args.name, desde, hasta, args.step, args.agg):
+        print(f"{from_ms(ts).isoformat()},{v}")
+
+
+if __name__ == "__main__":
+    main()